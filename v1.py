@@ -1,71 +1,397 @@
+import os
+import atexit
 import paramiko
 import hashlib
+import mmap
+import queue
+import sqlite3
+import threading
 from pathlib import Path
-from stat import S_ISDIR
+from stat import S_ISDIR, S_ISLNK
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def calculate_local_checksum(file_path, hash_algorithm='sha256'):
+# Do wykrywania zmian nie potrzeba skrótu kryptograficznego, więc domyślnie
+# używany jest szybszy BLAKE3 lub xxh3, a sha256 tylko gdy ich brak.
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+try:
+    from xxhash import xxh3_128
+except ImportError:
+    xxh3_128 = None
+
+# Liczba równoległych kanałów SFTP używanych do liczenia sum zdalnych plików
+SFTP_CHANNELS = 4
+
+# Rozmiar okna i maksymalny rozmiar pakietu kanałów SSH (domyślnie w paramiko 2 MiB i 32 KiB)
+SSH_WINDOW_SIZE = 16 * 1024 * 1024
+SSH_MAX_PACKET_SIZE = 256 * 1024
+
+# Odstęp (w sekundach) między pakietami keepalive połączeń SSH trzymanych w puli
+SSH_KEEPALIVE = 30
+
+# Maksymalna różnica czasów modyfikacji (w sekundach) uznawana w trybie fast za brak zmian
+MTIME_TOLERANCE = 2
+
+# Rozmiar bloku odczytu przy liczeniu sum kontrolnych (1 MiB)
+CHUNK_SIZE = 1 << 20
+
+# Pliki od MMAP_MIN_SIZE w górę haszowane są przez mmap w blokach po MMAP_CHUNK_SIZE
+MMAP_MIN_SIZE = 64 * 1024
+MMAP_CHUNK_SIZE = 1 << 22
+
+# Pliki nie większe niż SMALL_FILE_SIZE haszowane są w paczkach po SMALL_FILE_BATCH
+SMALL_FILE_SIZE = 1 << 20
+SMALL_FILE_BATCH = 64
+
+# Domyślny algorytm sum kontrolnych (hash_algorithm='sha256' nadal działa)
+HASH_ALGORITHM = 'blake3' if blake3 else 'xxh3_128' if xxh3_128 else 'sha256'
+
+# Plik bazy z zapamiętanymi sumami kontrolnymi
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'dircmp.sqlite')
+
+class ChecksumCache:
+    """Trwały cache sum kontrolnych w SQLite; wpis jest ważny, dopóki plik ma ten sam mtime i rozmiar."""
+
+    def __init__(self, db_path=CACHE_PATH):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checksums ("
+            "host TEXT, path TEXT, algorithm TEXT, mtime INTEGER, size INTEGER, checksum TEXT, "
+            "PRIMARY KEY (host, path, algorithm))"
+        )
+
+    # Cache tylko przyspiesza działanie, więc błędy SQLite (np. "database is locked"
+    # przy równoległych uruchomieniach) oznaczają brak wpisu, a nie błąd porównania.
+
+    def get(self, host, path, algorithm, mtime, size):
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT checksum FROM checksums "
+                    "WHERE host = ? AND path = ? AND algorithm = ? AND mtime = ? AND size = ?",
+                    (host, path, algorithm, mtime, size),
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+        return row[0] if row else None
+
+    def put(self, host, path, algorithm, mtime, size, checksum):
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?)",
+                    (host, path, algorithm, mtime, size, checksum),
+                )
+            except sqlite3.Error:
+                pass
+
+    def commit(self):
+        with self._lock:
+            try:
+                self._db.commit()
+            except sqlite3.Error:
+                pass
+
+_checksum_cache = None
+_checksum_cache_failed = False
+_checksum_cache_lock = threading.Lock()
+
+def get_checksum_cache():
+    """Zwraca współdzielony cache sum kontrolnych albo None, jeśli nie da się go otworzyć."""
+    global _checksum_cache, _checksum_cache_failed
+    with _checksum_cache_lock:
+        if _checksum_cache is None and not _checksum_cache_failed:
+            try:
+                _checksum_cache = ChecksumCache()
+            except (OSError, sqlite3.Error) as e:
+                _checksum_cache_failed = True
+                print(f"Uwaga: cache sum kontrolnych jest niedostępny ({e}), pliki będą haszowane od nowa.")
+    return _checksum_cache
+
+# Konstruktory rozwiązane raz przy imporcie; bezpośrednie wywołanie omija
+# wyszukiwanie algorytmu po nazwie, które hashlib.new robi dla każdego pliku
+_HASH_CTORS = {'sha256': hashlib.sha256, 'sha1': hashlib.sha1, 'md5': hashlib.md5}
+if blake3:
+    _HASH_CTORS['blake3'] = blake3
+if xxh3_128:
+    _HASH_CTORS['xxh3_128'] = xxh3_128
+
+def get_hash_factory(hash_algorithm):
+    """Zwraca konstruktor obiektu skrótu dla podanej nazwy algorytmu."""
+    hash_ctor = _HASH_CTORS.get(hash_algorithm)
+    if hash_ctor is None:
+        return lambda: hashlib.new(hash_algorithm)
+    return hash_ctor
+
+# sha256 jest szybkie (SHA-NI) tylko wtedy, gdy hashlib korzysta z OpenSSL >= 1.1.1
+if HASH_ALGORITHM == 'sha256' and hashlib.sha256.__name__ != 'openssl_sha256':
+    print(
+        "Uwaga: hashlib nie korzysta z OpenSSL, więc sha256 będzie wolniejsze. "
+        "Sprawdź wersję poleceniem: python -c \"import ssl; print(ssl.OPENSSL_VERSION)\" (zalecana >= 1.1.1)")
+
+def calculate_local_checksum(file_path, hash_algorithm=HASH_ALGORITHM, file_size=None):
     """Oblicza sumę kontrolną lokalnego pliku."""
-    hash_func = hashlib.new(hash_algorithm)
     with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b''):
+        # Znany rozmiar (z listy plików) oszczędza dodatkowe wywołanie fstat
+        if file_size is None:
+            file_size = os.fstat(f.fileno()).st_size
+        # Większe pliki haszowane są przez mmap prosto z pamięci podręcznej stron,
+        # bez alokowania nowego obiektu bytes na każdy blok
+        mm = None
+        if file_size >= MMAP_MIN_SIZE:
+            # Plik skrócony do zera po wylistowaniu (ValueError) lub system plików
+            # bez obsługi mmap (OSError) haszowany jest zwykłym odczytem poniżej
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                pass
+        if mm is not None:
+            hash_func = get_hash_factory(hash_algorithm)()
+            with mm:
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mm) as view:
+                    for offset in range(0, len(view), MMAP_CHUNK_SIZE):
+                        hash_func.update(view[offset:offset + MMAP_CHUNK_SIZE])
+            return hash_func.hexdigest()
+
+        # Python 3.11+: pętla odczytu działa w C, bez narzutu interpretera na każdy blok
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, get_hash_factory(hash_algorithm)).hexdigest()
+        hash_func = get_hash_factory(hash_algorithm)()
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
             hash_func.update(chunk)
     return hash_func.hexdigest()
 
-def calculate_remote_checksum(sftp, remote_path, hash_algorithm='sha256'):
+def calculate_remote_checksum(sftp, remote_path, hash_algorithm=HASH_ALGORITHM, file_size=None):
     """Oblicza sumę kontrolną zdalnego pliku przez SFTP."""
-    hash_func = hashlib.new(hash_algorithm)
+    hash_func = get_hash_factory(hash_algorithm)()
     with sftp.open(remote_path, 'rb') as f:
-        while True:
-            data = f.read(4096)
-            if not data:
-                break
-            hash_func.update(data)
+        # Znany rozmiar (z listdir_attr) oszczędza dodatkowe zapytanie stat do serwera
+        if file_size is None:
+            file_size = f.stat().st_size
+        # readv wysyła żądania dla wszystkich zakresów naraz i zwraca bloki w miarę
+        # nadchodzenia odpowiedzi, zamiast czekać na każdy blok osobno
+        ranges = [(offset, min(CHUNK_SIZE, file_size - offset)) for offset in range(0, file_size, CHUNK_SIZE)]
+        if ranges:
+            for chunk in f.readv(ranges):
+                hash_func.update(chunk)
     return hash_func.hexdigest()
 
+def cached_local_checksum(file_path, mtime_ns, size, hash_algorithm=HASH_ALGORITHM):
+    """Zwraca sumę kontrolną lokalnego pliku, licząc ją tylko dla plików nowych lub zmienionych."""
+    cache = get_checksum_cache()
+    path = os.path.abspath(file_path)
+    # Pliki lokalne zapisywane są w cache z pustą nazwą hosta
+    checksum = cache.get('', path, hash_algorithm, mtime_ns, size) if cache else None
+    if checksum is None:
+        checksum = calculate_local_checksum(path, hash_algorithm, size)
+        if cache:
+            cache.put('', path, hash_algorithm, mtime_ns, size, checksum)
+    return checksum
+
+_local_checksum_lock = threading.Lock()
+
+def hash_local_batch(entries):
+    """Liczy sumy kontrolne paczki plików lokalnych w jednym zadaniu puli wątków."""
+    results = []
+    for entry in entries:
+        # Plik usunięty lub nieczytelny po wylistowaniu nie przerywa całej paczki;
+        # zamiast sumy zwracany jest błąd
+        try:
+            results.append(cached_local_checksum(entry['full_path'], entry['mtime_ns'], entry['size']))
+        except OSError as e:
+            results.append(e)
+    return results
+
 def get_local_files(base_path):
-    """Zwraca słownik lokalnych plików z relatywną ścieżką i sumą kontrolną."""
+    """Zwraca słownik lokalnych plików z relatywną ścieżką, rozmiarem i czasem modyfikacji."""
     files = {}
-    for path in Path(base_path).rglob('*'):
-        if path.is_file():
-            rel_path = path.relative_to(base_path)
-            files[str(rel_path)] = {
-                'checksum': calculate_local_checksum(path)
-            }
+    # os.scandir zna typ wpisu bez dodatkowego wywołania stat, a wynik entry.stat() jest zapamiętywany
+    directories = [base_path]
+    while directories:
+        # Katalogi bez prawa odczytu są pomijane, tak jak robiło to rglob
+        try:
+            entries = os.scandir(directories.pop())
+        except PermissionError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    rel_path = os.path.relpath(entry.path, base_path)
+                    files[rel_path] = {
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime,
+                        'mtime_ns': stat.st_mtime_ns,
+                        'full_path': entry.path,
+                    }
     return files
 
+def get_local_checksums(files, names, executor):
+    """Zwraca sumy kontrolne wskazanych plików lokalnych; każdy plik haszowany jest tylko raz."""
+    names = list(names)
+
+    # Wątki serwerów współdzielą słownik plików: pierwszy, który potrzebuje sumy,
+    # zleca ją do wspólnej puli, a pozostałe czekają na to samo zadanie.
+    with _local_checksum_lock:
+        pending = [name for name in names if 'checksum_job' not in files[name]]
+
+        # hashlib zwalnia GIL przy większych blokach, więc sumy liczone w wątkach
+        # wykorzystują wszystkie rdzenie bez kosztu serializacji między procesami.
+        # Duże pliki idą do wątków pojedynczo, a małe w paczkach, żeby narzut
+        # na zadanie w puli nie przewyższał samego haszowania.
+        large = [[name] for name in pending if files[name]['size'] > SMALL_FILE_SIZE]
+        small = [name for name in pending if files[name]['size'] <= SMALL_FILE_SIZE]
+        batches = large + [small[i:i + SMALL_FILE_BATCH] for i in range(0, len(small), SMALL_FILE_BATCH)]
+        for batch in batches:
+            job = executor.submit(hash_local_batch, [files[name] for name in batch])
+            for index, name in enumerate(batch):
+                files[name]['checksum_job'] = (job, index)
+
+    checksums = {}
+    for name in names:
+        job, index = files[name]['checksum_job']
+        result = job.result()[index]
+        # Błąd odczytu zapisywany jest przy pliku i zgłaszany raz w głównym wątku
+        if isinstance(result, OSError):
+            files[name]['error'] = result
+        else:
+            checksums[name] = result
+    cache = get_checksum_cache()
+    if pending and cache:
+        cache.commit()
+    return checksums
+
 def get_remote_files(sftp, base_path):
-    """Rekurencyjnie pobiera pliki zdalne wraz z sumami kontrolnymi."""
+    """Pobiera listę plików zdalnych (z podkatalogami) wraz z rozmiarem i czasem modyfikacji."""
     files = {}
-
-    def recursive_list(path, relative_root=Path('.')):
+    # Jawny stos zamiast rekurencji: brak narzutu wywołań i ryzyka RecursionError w głębokich drzewach
+    directories = [(base_path, Path('.'))]
+    while directories:
+        path, relative_root = directories.pop()
         for entry in sftp.listdir_attr(path):
             full_path = f"{path}/{entry.filename}"
             rel_path = relative_root / entry.filename
             if S_ISDIR(entry.st_mode):
-                recursive_list(full_path, rel_path)
+                directories.append((full_path, rel_path))
+            elif S_ISLNK(entry.st_mode):
+                # listdir_attr zwraca atrybuty samego dowiązania (lstat), więc rozmiar
+                # i czas modyfikacji bierzemy z celu. Dowiązania do katalogów i zerwane
+                # dowiązania są pomijane, tak jak przy przeglądaniu katalogu lokalnego.
+                try:
+                    target = sftp.stat(full_path)
+                except IOError:
+                    continue
+                if not S_ISDIR(target.st_mode):
+                    files[str(rel_path)] = {
+                        'size': target.st_size, 'mtime': target.st_mtime, 'full_path': full_path, 'link': True
+                    }
             else:
-                checksum = calculate_remote_checksum(sftp, full_path)
-                files[str(rel_path)] = {
-                    'checksum': checksum,
-                    'full_path': full_path
-                }
-
-    recursive_list(base_path)
+                files[str(rel_path)] = {'size': entry.st_size, 'mtime': entry.st_mtime, 'full_path': full_path}
     return files
 
-def compare_files(source_files, dest_files):
-    """Porównuje pliki na podstawie sum kontrolnych i zwraca różnice."""
-    source_set = set(source_files.keys())
-    dest_set = set(dest_files.keys())
+def get_remote_checksums(sftp, files, names, server=None, channels=SFTP_CHANNELS):
+    """Zwraca sumy kontrolne wskazanych plików zdalnych, liczone równolegle przez SFTP."""
+    # Dla znanego serwera sumy niezmienionych plików (ten sam mtime i rozmiar
+    # z listdir_attr) brane są z cache, bez dodatkowych zapytań do serwera.
+    # Bez serwera (server=None) cache nie jest używany, a wszystkie pliki są czytane.
+    cache = get_checksum_cache() if server else None
+    checksums = {}
+    pending = []
+    for name in names:
+        entry = files[name]
+        checksum = cache.get(server, entry['full_path'], HASH_ALGORITHM, entry['mtime'], entry['size']) if cache else None
+        if checksum is None:
+            pending.append(name)
+        else:
+            checksums[name] = checksum
+    if not pending:
+        return checksums
 
-    added = source_set - dest_set
-    deleted = dest_set - source_set
-    modified = {
-        file for file in source_set & dest_set
-        if source_files[file]['checksum'] != dest_files[file]['checksum']
-    }
+    # Sumy liczone są równolegle na kilku kanałach SFTP tego samego połączenia,
+    # dzięki czemu opóźnienia sieci dla kolejnych plików nakładają się na siebie.
+    channels = max(1, min(channels, len(pending)))
+    transport = sftp.get_channel().get_transport()
+    extra_clients = []
+    idle_clients = queue.Queue()
+    idle_clients.put(sftp)
 
-    return added, deleted, modified
+    def hash_with_idle_client(name):
+        client = idle_clients.get()
+        try:
+            entry = files[name]
+            # Dla dowiązań rozmiar pliku docelowego ustalany jest przy otwartym pliku
+            file_size = None if entry.get('link') else entry['size']
+            return calculate_remote_checksum(client, entry['full_path'], file_size=file_size)
+        finally:
+            idle_clients.put(client)
+
+    try:
+        # Kanały otwierane są pojedynczo w try, żeby po błędzie zamknąć te już otwarte
+        for _ in range(channels - 1):
+            client = paramiko.SFTPClient.from_transport(transport)
+            extra_clients.append(client)
+            idle_clients.put(client)
+        with ThreadPoolExecutor(max_workers=channels) as executor:
+            results = executor.map(hash_with_idle_client, pending)
+            for name, checksum in zip(pending, results):
+                checksums[name] = checksum
+    finally:
+        for client in extra_clients:
+            client.close()
+
+    if cache:
+        for name in pending:
+            entry = files[name]
+            cache.put(server, entry['full_path'], HASH_ALGORITHM, entry['mtime'], entry['size'], checksums[name])
+        cache.commit()
+    return checksums
+
+def _same_mtime(source, dest):
+    # Tolerancja pokrywa różną dokładność znaczników czasu (np. 2 s na FAT, pełne sekundy w SFTP)
+    return dest['mtime'] is not None and abs(source['mtime'] - dest['mtime']) < MTIME_TOLERANCE
+
+def compare_files(source_files, dest_files, source_checksums, dest_checksums, fast=False):
+    """Porównuje pliki i zwraca (dodane, skasowane, zmodyfikowane, bez zmian)."""
+    # Widoki dict_keys obsługują operacje na zbiorach bez kopiowania do set()
+    source_keys = source_files.keys()
+    dest_keys = dest_files.keys()
+
+    added = source_keys - dest_keys
+    deleted = dest_keys - source_keys
+
+    # Różny rozmiar przesądza o zmianie, więc takich plików nie trzeba haszować
+    common = source_keys & dest_keys
+    size_mismatch = {file for file in common if source_files[file]['size'] != dest_files[file]['size']}
+    size_match = common - size_mismatch
+
+    # Tryb fast działa jak domyślne sprawdzenie w rsync: ten sam rozmiar i czas
+    # modyfikacji oznacza brak zmian, bez czytania zawartości plików
+    if fast:
+        to_hash = {file for file in size_match if not _same_mtime(source_files[file], dest_files[file])}
+    else:
+        to_hash = size_match
+
+    # source_checksums i dest_checksums zwracają słowniki sum dla podanych nazw plików;
+    # sumy lokalne (dysk i CPU) i zdalne (sieć) liczone są jednocześnie
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        source_future = executor.submit(source_checksums, to_hash)
+        dest_sums = dest_checksums(to_hash)
+        source_sums = source_future.result()
+    # Plików lokalnych, których nie udało się odczytać, nie można uznać ani za zmienione, ani za niezmienione
+    unreadable = to_hash - source_sums.keys()
+    modified = size_mismatch | {file for file in to_hash - unreadable if source_sums[file] != dest_sums[file]}
+    unchanged = common - modified - unreadable
+
+    return added, deleted, modified, unchanged
 
 def delete_remote_files(sftp, files_to_delete, remote_base_path):
     """Usuwa pliki zdalne, które nie występują w katalogu źródłowym."""
@@ -79,43 +405,149 @@ def delete_remote_files(sftp, files_to_delete, remote_base_path):
         except Exception as e:
             print(f"Błąd podczas usuwania {remote_file_path}: {e}")
 
-def compare_directories(source_path, servers, remote_path, username, key_path=None, password=None, auto_delete=False):
-    """Porównuje lokalny katalog ze zdalnymi katalogami i usuwa zbędne pliki, jeśli auto_delete=True."""
-    source_files = get_local_files(source_path)
+def open_ssh(server, username, key_path=None, password=None):
+    """Otwiera połączenie SSH z serwerem (kluczem lub hasłem)."""
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    try:
+        if key_path:
+            key = paramiko.RSAKey.from_private_key_file(key_path)
+            ssh.connect(server, username=username, pkey=key)
+        else:
+            ssh.connect(server, username=username, password=password)
 
-    for server in servers:
-        print(f"\nPorównanie z serwerem: {server}")
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # Kanały SFTP otwierane później dziedziczą te ustawienia; większe okno
+        # pozwala utrzymać więcej danych w drodze na łączach z dużym opóźnieniem.
+        transport = ssh.get_transport()
+        transport.default_window_size = SSH_WINDOW_SIZE
+        transport.default_max_packet_size = SSH_MAX_PACKET_SIZE
+    except Exception:
+        ssh.close()
+        raise
+    return ssh
 
-        try:
-            if key_path:
-                key = paramiko.RSAKey.from_private_key_file(key_path)
-                ssh.connect(server, username=username, pkey=key)
-            else:
-                ssh.connect(server, username=username, password=password)
+_ssh_pool = {}
+_ssh_pool_lock = threading.Lock()
+# Osobna blokada dla każdego (server, username): dwa wątki nie łączą się równocześnie z tym samym serwerem
+_ssh_key_locks = {}
 
-            sftp = ssh.open_sftp()
-            dest_files = get_remote_files(sftp, remote_path)
+def _is_active(ssh):
+    transport = ssh.get_transport()
+    return transport is not None and transport.is_active()
+
+def get_ssh(server, username, key_path=None, password=None):
+    """Zwraca połączenie SSH z puli, nawiązując nowe tylko wtedy, gdy brak aktywnego."""
+    key = (server, username)
+    with _ssh_pool_lock:
+        key_lock = _ssh_key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        with _ssh_pool_lock:
+            previous = _ssh_pool.get(key)
+        if previous is not None and _is_active(previous):
+            return previous
+
+        ssh = open_ssh(server, username, key_path, password)
+        # Keepalive nie pozwala serwerowi zamknąć bezczynnego połączenia czekającego w puli
+        ssh.get_transport().set_keepalive(SSH_KEEPALIVE)
+        with _ssh_pool_lock:
+            _ssh_pool[key] = ssh
+    if previous is not None:
+        previous.close()
+    return ssh
 
-            added, deleted, modified = compare_files(source_files, dest_files)
+def close_ssh_pool():
+    """Zamyka wszystkie połączenia SSH z puli."""
+    with _ssh_pool_lock:
+        clients = list(_ssh_pool.values())
+        _ssh_pool.clear()
+    for ssh in clients:
+        ssh.close()
 
-            print("Dodane:", added if added else "Brak")
-            print("Skasowane:", deleted if deleted else "Brak")
-            print("Zmodyfikowane:", modified if modified else "Brak")
+atexit.register(close_ssh_pool)
 
-            if auto_delete and deleted:
-                confirm = input(f"Czy chcesz usunąć {len(deleted)} zbędnych plików z serwera {server}? (tak/nie): ")
-                if confirm.lower() == 'tak':
-                    delete_remote_files(sftp, deleted, remote_path)
-                else:
-                    print("Pominięto usuwanie plików.")
+def _process_server(server, source_future, local_executor, remote_path, username, key_path=None, password=None, fast=False):
+    """Porównuje katalog z jednym serwerem; komunikaty buforuje, żeby wątki ich nie przeplatały."""
+    messages = [f"\nPorównanie z serwerem: {server}"]
+    deleted = set()
 
+    try:
+        sftp = get_ssh(server, username, key_path, password).open_sftp()
+        try:
+            dest_files = get_remote_files(sftp, remote_path)
+            source_files = source_future.result()
+            added, deleted, modified, _ = compare_files(
+                source_files,
+                dest_files,
+                lambda names: get_local_checksums(source_files, names, local_executor),
+                # Cache sum zdalnych ufa mtime z dokładnością do sekundy, więc korzysta
+                # z niego tylko tryb fast; bez niego zawartość plików zdalnych jest zawsze czytana
+                lambda names: get_remote_checksums(sftp, dest_files, names, server if fast else None),
+                fast,
+            )
+        finally:
             sftp.close()
-        except Exception as e:
-            print(f"Błąd podczas połączenia z {server}: {e}")
+
+        messages.append(f"Dodane: {added if added else 'Brak'}")
+        messages.append(f"Skasowane: {deleted if deleted else 'Brak'}")
+        messages.append(f"Zmodyfikowane: {modified if modified else 'Brak'}")
+    except Exception as e:
+        messages.append(f"Błąd podczas połączenia z {server}: {e}")
+
+    return messages, deleted
+
+def _delete_on_server(server, deleted, remote_path, username, key_path=None, password=None):
+    """Usuwa z serwera zbędne pliki, korzystając z połączenia z puli."""
+    try:
+        sftp = get_ssh(server, username, key_path, password).open_sftp()
+        try:
+            delete_remote_files(sftp, deleted, remote_path)
         finally:
-            ssh.close()
+            sftp.close()
+    except Exception as e:
+        print(f"Błąd podczas połączenia z {server}: {e}")
+
+def compare_directories(source_path, servers, remote_path, username, key_path=None, password=None, auto_delete=False, fast=False):
+    """Porównuje lokalny katalog ze zdalnymi katalogami i usuwa zbędne pliki, jeśli auto_delete=True."""
+    # Jedna pula obsługuje całą pracę lokalną: katalog przeglądany jest w tle,
+    # równolegle z łączeniem się z serwerami, a sumy plików lokalnych liczone
+    # są w niej raz, wspólnie dla wszystkich serwerów.
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as local_executor:
+        source_future = local_executor.submit(get_local_files, source_path)
+
+        # Serwery porównywane są równolegle (praca jest ograniczona siecią),
+        # a pytania o usunięcie plików zadawane są kolejno w głównym wątku.
+        with ThreadPoolExecutor(max_workers=max(1, min(32, len(servers)))) as executor:
+            futures = {
+                executor.submit(_process_server, server, source_future, local_executor, remote_path, username, key_path, password, fast): server
+                for server in servers
+            }
+
+            # Błąd przeglądania katalogu lokalnego zgłaszany jest raz, w głównym wątku,
+            # a nie przez każdy serwer osobno jako błąd połączenia
+            try:
+                source_future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+            for future in as_completed(futures):
+                server = futures[future]
+                messages, deleted = future.result()
+                print("\n".join(messages))
+
+                if auto_delete and deleted:
+                    confirm = input(f"Czy chcesz usunąć {len(deleted)} zbędnych plików z serwera {server}? (tak/nie): ")
+                    if confirm.lower() == 'tak':
+                        _delete_on_server(server, deleted, remote_path, username, key_path, password)
+                    else:
+                        print("Pominięto usuwanie plików.")
+
+            # Błędy odczytu plików lokalnych zgłaszane są raz, a nie przez każdy serwer
+            # jako błąd połączenia
+            for name, entry in sorted(source_future.result().items()):
+                if 'error' in entry:
+                    print(f"Błąd odczytu pliku lokalnego {name}: {entry['error']}")
 
 # PRZYKŁAD UŻYCIA
 servers = ["server1.example.com", "server2.example.com"]
@@ -126,4 +558,5 @@ key_path = "/path/to/private/key"  # lub None jeśli używasz hasła
 password = None  # lub "your_password" jeśli nie używasz klucza
 
 auto_delete = True  # Ustaw na True, jeśli chcesz automatycznie usuwać zbędne pliki
-compare_directories(source_directory, servers, remote_directory, username, key_path, password, auto_delete)
+fast = False  # True: pliki o tym samym rozmiarze i czasie modyfikacji nie są haszowane (jak w rsync), a sumy zdalne brane są z cache
+compare_directories(source_directory, servers, remote_directory, username, key_path, password, auto_delete, fast)